@@ -1,21 +1,32 @@
 #!/usr/bin/env python
 
 import typing
+import functools
+import importlib.util
+from types import MappingProxyType
 from io import BytesIO
+from itertools import chain, islice
 import logging
+import numpy as np
 import networkx as nx
-import matplotlib.pyplot as plt  # type: ignore
 from uuid import uuid4
-from csv import reader
+from csv import reader, writer
 import click
 
+# numba is optional, and is only imported once a graph is large enough to use the compiled kernels
+NUMBA_AVAILABLE = importlib.util.find_spec("numba") is not None
 
-logging.basicConfig(
-    encoding='utf-8',
-    level=logging.DEBUG,
-    format='%(asctime)s.%(msecs)03d %(levelname)s:\t%(message)s',
-    datefmt='%Y-%m-%d %H:%M:%S'
-)
+# Loading the compiled kernels takes about 0.3 seconds even from numba's on-disk cache.
+# Below this many edges the list and NumPy versions finish sooner, for deep and shallow graphs alike.
+JIT_MIN_EDGES = 600_000
+
+# The layered NumPy relaxation makes a couple dozen NumPy calls per layer of the graph,
+# so it only beats the list-based loop when the layers hold this many edges on average
+LAYERED_MIN_EDGES_PER_LAYER = 10_000
+
+
+# Messages use lazy %-style arguments, so large dicts are only formatted when the record is emitted
+log = logging.getLogger(__name__)
 
 class CalculationError(Exception):
     pass
@@ -32,6 +43,183 @@ class NodeWeightsDuplicateValues(CalculationError):
 class MustBeDirectedAcyclicGraph(CalculationError):
     pass
 
+class NodeWeightsMustBeIntegers(CalculationError):
+    pass
+
+
+def _longest_path_csr_loop(
+    indptr: np.ndarray, indices: np.ndarray, weights: np.ndarray, topo: np.ndarray
+) -> typing.Tuple[np.ndarray, np.ndarray]:
+    """
+    Find the longest path to every node with a single forward pass over the nodes in topological order.
+    `dist[v]` is the length of the longest path ending at `v`, and `pred[v]` is the node before `v` on that path, or -1.
+    The loop carries a dependency from each node to its successors, so it stays sequential.
+    """
+    dist = np.zeros(len(weights), dtype=np.int64)
+    pred = np.full(len(weights), -1, dtype=np.int64)
+    for u in topo:
+        candidate = dist[u] + weights[u]
+        for k in range(indptr[u], indptr[u + 1]):
+            v = indices[k]
+            if candidate > dist[v]:
+                dist[v] = candidate
+                pred[v] = u
+    return dist, pred
+
+
+def _longest_path_csr_python(
+    indptr: np.ndarray, indices: np.ndarray, weights: np.ndarray, topo: np.ndarray
+) -> typing.Tuple[np.ndarray, np.ndarray]:
+    """
+    Same as `_longest_path_csr_loop()`, on Python lists, which is faster than indexing numpy arrays element by element.
+    """
+    starts, successors, node_weights = indptr.tolist(), indices.tolist(), weights.tolist()
+    dist = [0] * len(node_weights)
+    pred = [-1] * len(node_weights)
+    for u in topo.tolist():
+        candidate = dist[u] + node_weights[u]
+        for v in successors[starts[u]:starts[u + 1]]:
+            if candidate > dist[v]:
+                dist[v] = candidate
+                pred[v] = u
+    return np.array(dist, dtype=np.int64), np.array(pred, dtype=np.int64)
+
+
+def _longest_path_csr_numpy(
+    indptr: np.ndarray, indices: np.ndarray, weights: np.ndarray, topo: np.ndarray
+) -> typing.Tuple[np.ndarray, np.ndarray]:
+    """
+    Same result as `_longest_path_csr_loop()`, relaxed one layer of the graph at a time with NumPy ufuncs.
+    Each layer holds the nodes whose predecessors are all in earlier layers, so their distances are final
+    and all of their outgoing edges can be relaxed at once with `np.maximum.at`.
+    The number of Python-level iterations is the depth of the graph instead of the number of edges,
+    so this is only faster than `_longest_path_csr_python()` for wide, shallow graphs.
+    """
+    n = len(weights)
+    sources = np.repeat(np.arange(n), np.diff(indptr))
+    dist = np.zeros(n, dtype=np.int64)
+    in_degrees = np.bincount(indices, minlength=n)
+    layer = np.flatnonzero(in_degrees == 0)
+    while layer.size:
+        # Positions of all edges leaving the layer, concatenated from each node's CSR range
+        starts, counts = indptr[layer], indptr[layer + 1] - indptr[layer]
+        edges = np.repeat(starts - (np.cumsum(counts) - counts), counts) + np.arange(counts.sum())
+        u, v = sources[edges], indices[edges]
+        np.maximum.at(dist, v, dist[u] + weights[u])
+        np.subtract.at(in_degrees, v, 1)
+        v = np.unique(v)
+        layer = v[in_degrees[v] == 0]
+
+    # An edge is on a longest path when it reaches its successor's final distance.
+    # Like the sequential loop, keep the first such predecessor in topological order, and none for a distance of 0.
+    candidates = dist[sources] + weights[sources]
+    tight = (candidates == dist[indices]) & (dist[indices] > 0)
+    rank = np.empty(n, dtype=np.int64)
+    rank[topo] = np.arange(n)
+    first_rank = np.full(n, n, dtype=np.int64)
+    np.minimum.at(first_rank, indices[tight], rank[sources[tight]])
+    pred = np.full(n, -1, dtype=np.int64)
+    has_pred = first_rank < n
+    pred[has_pred] = topo[first_rank[has_pred]]
+    return dist, pred
+
+
+def _topological_order_csr_loop(indptr: np.ndarray, indices: np.ndarray) -> typing.Tuple[np.ndarray, int]:
+    """
+    Kahn's algorithm over the CSR arrays.  The output array doubles as the FIFO queue.
+    Returns fewer than `len(indptr) - 1` nodes when the graph has a cycle.
+    Also returns the depth of the graph: the FIFO queue releases the nodes one generation at a time,
+    and a node's generation is the number of nodes on the longest path ending at it.
+    """
+    in_degrees = np.zeros(len(indptr) - 1, dtype=np.int64)
+    for v in indices:
+        in_degrees[v] += 1
+    topo = np.empty(len(in_degrees), dtype=np.int64)
+    head = tail = 0
+    for u in range(len(in_degrees)):
+        if in_degrees[u] == 0:
+            topo[tail] = u
+            tail += 1
+    depth = 0
+    while head < tail:
+        depth += 1
+        generation_end = tail
+        while head < generation_end:
+            u = topo[head]
+            head += 1
+            for k in range(indptr[u], indptr[u + 1]):
+                v = indices[k]
+                in_degrees[v] -= 1
+                if in_degrees[v] == 0:
+                    topo[tail] = v
+                    tail += 1
+    return topo[:tail], depth
+
+
+def _topological_order_csr_python(indptr: np.ndarray, indices: np.ndarray) -> typing.Tuple[np.ndarray, int]:
+    """
+    Same as `_topological_order_csr_loop()`, on Python lists, which is faster than indexing numpy arrays element by element.
+    """
+    in_degrees = np.bincount(indices, minlength=len(indptr) - 1).tolist()
+    starts, successors = indptr.tolist(), indices.tolist()
+    topo = [u for u, in_degree in enumerate(in_degrees) if in_degree == 0]
+    head = depth = 0
+    while head < len(topo):
+        depth += 1
+        generation_end = len(topo)
+        for u in topo[head:generation_end]:
+            for v in successors[starts[u]:starts[u + 1]]:
+                in_degrees[v] -= 1
+                if in_degrees[v] == 0:
+                    topo.append(v)
+        head = generation_end
+    return np.array(topo, dtype=np.int64), depth
+
+
+@functools.cache
+def _get_jit_kernels() -> typing.Tuple[typing.Callable, typing.Callable]:
+    """
+    Compile `_longest_path_csr_loop()` and `_topological_order_csr_loop()` with numba, the first time they're needed.
+    The compiled code is kept in numba's on-disk cache, so later runs only load it.
+    """
+    from numba import njit
+
+    jit = njit(cache=True, boundscheck=False)
+    return jit(_longest_path_csr_loop), jit(_topological_order_csr_loop)
+
+
+def _use_jit(edge_count: int) -> bool:
+    """
+    Whether to use the numba kernels for a graph with `edge_count` edges.
+    numba's on-disk cache records the defining module by name, which is only stable when this module is imported
+    from the package.  Run as the CLI script, or imported as a top-level module, the kernels would be compiled
+    from scratch every run, so the list and NumPy versions are used instead.
+    """
+    return NUMBA_AVAILABLE and bool(__package__) and edge_count >= JIT_MIN_EDGES
+
+
+def _get_topological_order_kernel(edge_count: int) -> typing.Callable:
+    """
+    The topological sort function to use for a graph with `edge_count` edges.
+    """
+    if _use_jit(edge_count):
+        return _get_jit_kernels()[1]
+    return _topological_order_csr_python
+
+
+def _get_longest_path_kernel(edge_count: int, depth: int) -> typing.Callable:
+    """
+    The longest path function to use for a graph with `edge_count` edges and `depth` layers.
+    Large graphs use the compiled loop whatever their depth.  Otherwise deep graphs use the list-based loop,
+    and only wide, shallow graphs use the layered NumPy version.
+    The sequential loop runs one interpreted step per edge on numpy arrays, so it's never used uncompiled.
+    """
+    if _use_jit(edge_count):
+        return _get_jit_kernels()[0]
+    if edge_count >= LAYERED_MIN_EDGES_PER_LAYER * depth:
+        return _longest_path_csr_numpy
+    return _longest_path_csr_python
+
 
 class CriticalPath():
     """
@@ -42,15 +230,14 @@ class CriticalPath():
     
     The variables `u`, `v` represent the predecessor (parent) and successor (child) nodes of an edge.  This naming convention is borrowed from the networkx package.
     """
-    EDGE_WEIGHT_ATTRIBUTE_NAME = "weight"
-    EDGE_COLOR_ATTRIBUTE_NAME = "color"
 
     def __init__(self, graph: nx.DiGraph=None, node_weights_map:typing.Dict[any, int]=None):
-        logging.info("Creating CriticalPath object")
+        log.info("Creating CriticalPath object")
         # The weight values are ints to simplify the calculations and validation.
         # Take care that the inputs and outputs are treated as the same units,
         # for example as hours, minutes or seconds.  Unit conversion and fractional units are not supported within the module.
         # Inputs
+        self._edges: typing.List[tuple] = None
         self.graph = graph
         self.node_weights_map = node_weights_map
         # Output
@@ -60,83 +247,229 @@ class CriticalPath():
         # Location of the graph's image file
         self.image: typing.Union[str, BytesIO] = None
 
+    @classmethod
+    def from_edges(cls, edges: typing.Iterable[tuple], node_weights_map: typing.Dict[any, int]) -> "CriticalPath":
+        """
+        Create a CriticalPath from a list of edge tuples without building a networkx graph.
+        `find()` works on the edges directly, and the networkx graph is only built when `self.graph` is read
+        or an image is saved.  For small graphs, building the networkx graph costs more than the calculation.
+        """
+        cp = cls(node_weights_map=node_weights_map)
+        # The edges are copied, so changes to the caller's list don't reach the cached results
+        cp._edges = list(edges)
+        cp._clear_cache()
+        return cp
+
+    @property
+    def graph(self) -> nx.DiGraph:
+        """
+        A frozen snapshot of the graph the results are calculated from, without node or edge attributes.
+        To change the graph, assign an updated graph.
+        """
+        if self._graph is None and self._edges is None:
+            return None
+        return self._graph_snapshot
+
+    @graph.setter
+    def graph(self, graph: nx.DiGraph) -> None:
+        self._graph = graph
+        self._edges = None
+        self._clear_cache()
+        # Snapshot the graph's structure now, so the cached results always match the graph as it was assigned.
+        # Changing the graph in place afterwards has no effect until it is assigned again.
+        if graph is not None:
+            self._csr = self._get_csr_from_digraph(graph)
+
     @property
+    def node_weights_map(self) -> typing.Mapping[any, int]:
+        """
+        A read-only view of the node weights.  To change a weight, assign an updated dict.
+        """
+        if self._node_weights_map is None:
+            return None
+        return MappingProxyType(self._node_weights_map)
+
+    @node_weights_map.setter
+    def node_weights_map(self, node_weights_map: typing.Mapping[any, int]) -> None:
+        # Keep a copy, for the same reason the graph is snapshotted.
+        # A plain dict, unlike a mappingproxy, lets instances be copied and pickled.
+        self._node_weights_map = None if node_weights_map is None else dict(node_weights_map)
+        self._clear_cache(graph_changed=False)
+
+    def _clear_cache(self, graph_changed: bool = True) -> None:
+        """
+        Drop values derived from the inputs, so they are recalculated from the new inputs.
+        Values derived only from the graph are kept when just the node weights change.
+        """
+        names = ["_validated", "edge_weights", "_node_weights", "_critical_path"]
+        if graph_changed:
+            names += ["_csr", "_topo", "_layout", "_graph_snapshot"]
+        for name in names:
+            self.__dict__.pop(name, None)
+
+    @functools.cached_property
     def edge_weights(self) -> typing.Dict[tuple, int]:
         """
         Assign the same weight to all edges of u.
 
         The graph assumes task-on-node.
         Therefore all edges that have the same predecessor node `u` also share the same weight.
+        The result is cached until `self.graph` or `self.node_weights_map` is replaced.
         """
         self.validate()
-        for node in self.node_weights_map.keys():
-            if node not in self.graph.nodes:
-                raise Exception(
-                    f"Node {node} from self.node_weights_map does not exist in self.graph.nodes"
-                )
-        try:
-            result = {(u, v): self.node_weights_map[u] for u, v in self.graph.edges}
-        except KeyError as e:
-            raise KeyError(f"The graph node {e} does not exist in self.node_weights_map")
-        logging.debug(f"Edge weights: {result}")
+        nodes, indptr, indices = self._csr
+
+        # Gather the weight of each edge's predecessor node in one vectorized step.
+        # The CSR edges are in the same order as `self.graph.edges`, so the graph itself isn't needed.
+        edge_sources = np.repeat(np.arange(len(nodes)), np.diff(indptr))
+        edges = zip(map(nodes.__getitem__, edge_sources.tolist()), map(nodes.__getitem__, indices.tolist()))
+        result = dict(zip(edges, self._node_weights[edge_sources].tolist()))
+        log.debug("Edge weights: %s", result)
         return result
 
+    @functools.cached_property
+    def _csr(self) -> typing.Tuple[typing.List[any], np.ndarray, np.ndarray]:
+        """
+        CSR arrays of the graph, see `_get_csr_from_adjacency()`.  Cached until the inputs are replaced.
+        The graph setter fills this in eagerly, so it's only calculated here for instances from `from_edges()`.
+        """
+        return self._get_csr_from_adjacency(self._get_adjacency_from_tuples(self._edges))
+
+    @functools.cached_property
+    def _topo(self) -> typing.Tuple[np.ndarray, int]:
+        """
+        Topological order of the CSR node indexes and the depth of the graph, see `_get_topological_order_from_csr()`.
+        Cached until the inputs are replaced.
+        """
+        _, indptr, indices = self._csr
+        return self._get_topological_order_from_csr(indptr, indices)
+
+    @functools.cached_property
+    def _node_weights(self) -> np.ndarray:
+        """
+        The weight of each node, indexed by the node's position in the CSR `nodes` list.
+        Nodes without successors never contribute their weight, so they may be missing from the map and default to 0.
+        """
+        nodes = self._csr[0]
+        return np.fromiter(
+            (self.node_weights_map.get(node, 0) for node in nodes), dtype=np.int64, count=len(nodes)
+        )
+
+    @functools.cached_property
+    def _graph_snapshot(self) -> nx.DiGraph:
+        """
+        The graph that the results were calculated from, rebuilt from the CSR arrays.
+        It's frozen, so changing it in place raises instead of silently leaving the cached results stale.
+        """
+        nodes, indptr, indices = self._csr
+        # The CSR edges are in the same order as the original graph's edges
+        edge_sources = np.repeat(np.arange(len(nodes)), np.diff(indptr))
+        graph = nx.DiGraph()
+        graph.add_nodes_from(nodes)
+        graph.add_edges_from(zip(map(nodes.__getitem__, edge_sources.tolist()), map(nodes.__getitem__, indices.tolist())))
+        return nx.freeze(graph)
+
+    @functools.cached_property
+    def _layout(self) -> typing.Dict[any, np.ndarray]:
+        """
+        Node positions for drawing the graph.  The planar embedding is cached until the inputs are replaced.
+        """
+        return nx.planar_layout(self._graph_snapshot)
+
     def load_weights(self, path: str) -> None:
         """
         Load weights from a csv file containing the node and the node weight.  
         The node weight is later assigned to all edge weights where the node is the predecessor.
         """
-        with open(path, 'r') as read_obj:
+        # A large read buffer cuts down on read() calls for big weights files
+        with open(path, 'r', buffering=1 << 20, newline='') as read_obj:
             csv_reader = reader(read_obj)
-            node_weights = list(csv_reader)[1:]
+            # Skip the header row
+            next(csv_reader, None)
             node_weights_map = {}
-            for i, (node, weight) in enumerate(node_weights):
-                if not node_weights_map.get(node):
-                    node_weights_map[node] = int(weight)
-                else:
+            for i, row in enumerate(csv_reader, start=1):
+                node, weight = row
+                if node in node_weights_map:
                     raise NodeWeightsDuplicateValues(
                         "The node weights csv file requires unique node values in column 1.  "
-                        f"Node value `{node}` is duplicated on row {i+1}: {node_weights[i]}"
+                        f"Node value `{node}` is duplicated on row {i}: {row}"
                     )
-            logging.debug(f"Node weight map from {path}: {node_weights_map}")
+                node_weights_map[node] = int(weight)
+            log.debug("Node weight map from %s: %s", path, node_weights_map)
             self.node_weights_map = node_weights_map
 
     def validate(self) -> None:
         """
-        Validate that required instance variables exist before running calcs
+        Validate that required instance variables exist before running calcs,
+        and that every node with successors has a weight.
+        Passing inputs are remembered until they are replaced, so repeated calls from `find()` and `save_image()` are free.
         """
+        if self.__dict__.get("_validated"):
+            return
+
         if not self.node_weights_map:
             raise MissingInputsException("Undefined instance variable: self.node_weights_map")
 
-        if not self.graph:
+        # Instances from `from_edges()` are validated against their edges, without building the networkx graph
+        if not (self._graph or self._edges):
             raise MissingInputsException("Undefined instance variable: self.graph")
 
+        nodes, indptr, _ = self._csr
+        missing_nodes = self.node_weights_map.keys() - set(nodes)
+        if missing_nodes:
+            raise Exception(
+                f"Nodes {missing_nodes} from self.node_weights_map do not exist in self.graph.nodes"
+            )
+
+        # Every node with successors needs a weight for its outgoing edges
+        missing_nodes = {nodes[u] for u in np.flatnonzero(np.diff(indptr))} - self.node_weights_map.keys()
+        if missing_nodes:
+            raise KeyError(f"The graph nodes {missing_nodes} do not exist in self.node_weights_map")
+
+        # The calculation runs on int64 arrays, which would silently truncate fractional weights
+        non_integers = {
+            node: weight for node, weight in self.node_weights_map.items() if not self._is_integer(weight)
+        }
+        if non_integers:
+            raise NodeWeightsMustBeIntegers(
+                f"Node weights must be integers: {non_integers}.  "
+                "Convert them to a smaller unit first, for example from hours to minutes."
+            )
+
+        self._validated = True
+
     def find(self) -> typing.Dict[tuple, int]:
         """
-        Calculate the critical path and return the list of critical path edges
+        Calculate the critical path and return the list of critical path edges.
+        The result is cached until `self.graph` or `self.node_weights_map` is assigned again.
+        Both are copied when assigned, so changing the originals in place has no effect until then.
         """
         self.validate()
-        edge_weights = self.edge_weights
-        nx.set_edge_attributes(self.graph, edge_weights, self.EDGE_WEIGHT_ATTRIBUTE_NAME)
+        self.critical_path_edges, self.critical_path_length, result = self._critical_path
+        # Return a copy so that callers can't change the cached result
+        return dict(result)
 
-        longest_path_nodes = nx.dag_longest_path(self.graph)
-        self.critical_path_edges = self._get_edges_from_ordered_list_of_nodes(longest_path_nodes)
-        self.critical_path_length = nx.dag_longest_path_length(self.graph)
-        result = {(u, v): edge_weights[(u, v)] for u, v in self.critical_path_edges}
+    @functools.cached_property
+    def _critical_path(self) -> typing.Tuple[typing.List[tuple], int, typing.Dict[tuple, int]]:
+        """
+        The critical path edges, the critical path length, and the weights of the critical path edges
+        """
+        nodes, indptr, indices = self._csr
+        topo, depth = self._topo
+        longest_path_csr = _get_longest_path_kernel(len(indices), depth)
+        dist, pred = longest_path_csr(indptr, indices, self._node_weights, topo)
 
-        logging.info(
-            f"Critical path result: {result}"
-            f"Critical path length: {self.critical_path_length}"
-            )
-        
-        # Validate that the sum of edge weights matches the value of self.critical_path_length
-        edge_weights_sum = sum(result.values())
-        if edge_weights_sum != self.critical_path_length:
-            raise Exception(
-                f"The sum of edge weights `{edge_weights_sum}` must be the same as the self.critical_path_length `{self.critical_path_length}`"
-            )
+        # The longest path ends at the node with the largest distance, which is also the path length
+        target = int(dist.argmax())
+        critical_path_edges = self._get_edges_from_predecessors(nodes, pred, target)
+        critical_path_length = int(dist[target])
+        # Only the path edges need weights, so the full edge_weights dict is never built here
+        result = {(u, v): self.node_weights_map[u] for u, v in critical_path_edges}
 
-        return result
+        log.info("Critical path result: %s\tCritical path length: %s", result, critical_path_length)
+        assert sum(result.values()) == critical_path_length, "The sum of the edge weights must match the path length"
+
+        return critical_path_edges, critical_path_length, result
 
     def save_image(self, fname: typing.Union[str, BytesIO]) -> typing.Union[str, BytesIO]:
         """
@@ -156,62 +489,154 @@ class CriticalPath():
                 "before calling self.save_image()."
             )
 
-        logging.info("Drawing graph")
-        # Assign edge labels
-        edge_labels = nx.get_edge_attributes(self.graph, self.EDGE_WEIGHT_ATTRIBUTE_NAME)
-        pos = nx.planar_layout(self.graph)
-        nx.draw_networkx_edge_labels(self.graph, pos=pos, edge_labels=edge_labels)
-
-        # Set a default color so that attribute keys exist for all edges
-        for u, v in self.graph.edges():
-            self.graph[u][v][self.EDGE_COLOR_ATTRIBUTE_NAME] = EDGE_COLOR_DEFAULT
-        # Update the edge color highlighting the critical path edges
-        for u, v in self.critical_path_edges:
-            self.graph[u][v][self.EDGE_COLOR_ATTRIBUTE_NAME] = EDGE_COLOR_CRITICAL_PATH
-        # Fetch all edge colors and assign to the graph drawing
-        edge_color_list = [self.graph[u][v][self.EDGE_COLOR_ATTRIBUTE_NAME] for u, v in self.graph.edges()]
-        logging.debug(f"\tEdge color list: {edge_color_list} ")
-        nx.draw_planar(self.graph, with_labels=True, edge_color=edge_color_list)
+        # Importing matplotlib is slow, so only pay for it when an image is saved
+        try:
+            from matplotlib.figure import Figure  # type: ignore
+        except ImportError as e:
+            raise ImportError(
+                "Saving an image requires matplotlib.  Install it with `pip install critical-path-finder[plot]`."
+            ) from e
+
+        log.info("Drawing graph")
+        # A standalone figure is saved with its own canvas, so pyplot's global state and the caller's backend are untouched
+        fig = Figure()
+        ax = fig.subplots()
+        # Label the edges with their weights
+        nx.draw_networkx_edge_labels(self._graph_snapshot, pos=self._layout, edge_labels=self.edge_weights, ax=ax)
+
+        # Highlight the critical path edges without writing colors into the graph.
+        # The cached edge weights are keyed in the drawn graph's edge order, so iterate those instead of the graph again.
+        critical_path_edges = frozenset(self.critical_path_edges)
+        edge_color_list = [
+            EDGE_COLOR_CRITICAL_PATH if edge in critical_path_edges else EDGE_COLOR_DEFAULT
+            for edge in self.edge_weights
+        ]
+        log.debug("\tEdge color list: %s", edge_color_list)
+        # Same as nx.draw_planar, but reuses the cached layout instead of embedding the graph again
+        nx.draw(self._graph_snapshot, pos=self._layout, ax=ax, with_labels=True, edge_color=edge_color_list)
 
         if type(fname) == str:
             self.image = f"{fname}/{FILENAME_PREFIX}-{uuid4()}.{FILE_EXTENSION}" 
-            logging.info(f"\tSaving image to file path: {self.image} ")
+            log.info("\tSaving image to file path: %s", self.image)
         elif type(fname) == BytesIO:
             self.image = fname
             self.image.name = f"{FILENAME_PREFIX}-{uuid4()}.{FILE_EXTENSION}"
-            logging.info(f"\tSaving image to file object named: {self.image.name} ")
+            log.info("\tSaving image to file object named: %s", self.image.name)
         else:
             raise Exception(f"Unhandled file type {fname(type)}")
 
-        plt.savefig(self.image, format=FILE_EXTENSION)
-        logging.debug("\tDone saving image")
-        plt.clf()
+        fig.savefig(self.image, format=FILE_EXTENSION)
+        log.debug("\tDone saving image")
 
         return self.image
 
+    @staticmethod
+    def _is_integer(weight: any) -> bool:
+        """
+        Whether the weight has an integer value, like 2 or 2.0.
+        """
+        try:
+            return weight == int(weight)
+        except (TypeError, ValueError, OverflowError):
+            return False
+
+    @staticmethod
+    def _get_csr_from_digraph(graph: nx.DiGraph) -> typing.Tuple[typing.List[any], np.ndarray, np.ndarray]:
+        """
+        Convert the graph to compressed sparse row (CSR) arrays, see `_get_csr_from_adjacency()`.
+        """
+        return CriticalPath._get_csr_from_adjacency(graph.succ)
+
+    @staticmethod
+    def _get_adjacency_from_tuples(
+        edges: typing.Iterable[tuple], nodes: typing.Iterable[any] = ()
+    ) -> typing.Dict[any, typing.Dict[any, None]]:
+        """
+        Map each node to its successors, in the same node and edge order that `nx.DiGraph(edges)` would use.
+        Any `nodes` are added first, like calling `add_nodes_from(nodes)` before adding the edges.
+        Duplicate edges are dropped, the same as in a DiGraph.
+        """
+        adjacency = {node: {} for node in nodes}
+        for u, v in edges:
+            adjacency.setdefault(u, {})[v] = None
+            adjacency.setdefault(v, {})
+        return adjacency
+
+    @staticmethod
+    def _get_csr_from_adjacency(
+        adjacency: typing.Mapping[any, typing.Iterable[any]]
+    ) -> typing.Tuple[typing.List[any], np.ndarray, np.ndarray]:
+        """
+        Convert a mapping of each node to its successors into compressed sparse row (CSR) arrays,
+        where each node is identified by its position in `nodes`.
+        The successors of node `u` are `indices[indptr[u]:indptr[u + 1]]`.
+        """
+        nodes = list(adjacency)
+        indptr = np.zeros(len(nodes) + 1, dtype=np.int64)
+        # The adjacency is keyed by predecessor node in the same order as `nodes`
+        successors = adjacency.values()
+        out_degrees = np.fromiter(map(len, successors), dtype=np.int64, count=len(nodes))
+        np.cumsum(out_degrees, out=indptr[1:])
+        if nodes == list(range(len(nodes))):
+            # Nodes already labelled 0..n-1 in order are their own positions, so skip the per-edge lookup
+            neighbors = chain.from_iterable(successors)
+        else:
+            node_index = {node: i for i, node in enumerate(nodes)}
+            neighbors = (node_index[v] for nbrs in successors for v in nbrs)
+        indices = np.fromiter(neighbors, dtype=np.int64, count=int(indptr[-1]))
+        return nodes, indptr, indices
+
+    @staticmethod
+    def _get_topological_order_from_csr(indptr: np.ndarray, indices: np.ndarray) -> typing.Tuple[np.ndarray, int]:
+        """
+        Topologically sort the CSR graph using Kahn's algorithm.
+        Returns the order and the depth of the graph, the number of nodes on its longest path.
+        """
+        topological_order_csr = _get_topological_order_kernel(len(indices))
+        topo, depth = topological_order_csr(indptr, indices)
+        if len(topo) < len(indptr) - 1:
+            raise MustBeDirectedAcyclicGraph(
+                "Circular reference detected while sorting the graph.  "
+                "The input graph must be an acyclic directed graph.  Fix the circular reference and try again."
+                )
+        return topo, depth
+
+    @staticmethod
+    def _get_edges_from_predecessors(nodes: typing.List[any], pred: np.ndarray, v: int) -> typing.List[tuple]:
+        """
+        Backtrack through the predecessor array from node `v` to the start of the path ending at `v`.
+        Returns the ordered list of edge tuples along that path, without building the list of path nodes first.
+        """
+        result = []
+        u = int(pred[v])
+        while u != -1:
+            result.append((nodes[u], nodes[v]))
+            v, u = u, int(pred[u])
+        result.reverse()
+        log.debug("Edges from predecessors: %s", result)
+
+        return result
+
     @staticmethod
     def _get_edges_from_ordered_list_of_nodes(nodes: typing.List[any]) -> typing.List[tuple]:
         """
         Convert ordered list of individual nodes to an ordered list of edge tuples.
         The successor node of one tuple becomes the predecessor node of the next tuple.
         """
-        result = [(nodes[i], nodes[i + 1]) for i in range(len(nodes) - 1)]
-        logging.debug(f"Edges from ordered list of nodes: {result}")
+        result = list(zip(nodes, islice(nodes, 1, None)))
+        log.debug("Edges from ordered list of nodes: %s", result)
 
         return result
     
     @staticmethod
-    def _get_digraph_from_tuples(graph: typing.List[tuple]) -> nx.DiGraph:
+    def _get_digraph_from_tuples(graph: typing.Iterable[tuple]) -> nx.DiGraph:
         """
-        Reads a list of tuples representing a digraph.
+        Reads an iterable of tuples representing a digraph.
+        Edges are consumed in a single pass, so a generator can be passed without building a list first.
         """
-        logging.info("Loading graph from list of tuples")
+        log.info("Loading graph from list of tuples")
         G = nx.DiGraph(graph)
-        logging.debug(
-            f"\tGraph loaded from list of tuples: {G}"
-            f"\tNodes: {G.nodes}"
-            f"\tEdges: {G.edges}"
-            )
+        log.debug("\tGraph loaded from list of tuples: %s\tNodes: %s\tEdges: %s", G, G.nodes, G.edges)
 
         try:
             first_cycle = nx.find_cycle(G, orientation='original')
@@ -225,38 +650,55 @@ class CriticalPath():
 
 
     @staticmethod
-    def _get_edge_tuples_from_dotviz(path: str) -> typing.List[typing.Tuple]:
+    def _get_edge_tuples_from_dotviz(path: typing.Union[str, typing.TextIO]) -> typing.List[typing.Tuple]:
         """
-        Reads a graphviz .dot file representing a digraph. 
-        Path can be a filesystem path or a string containing the data
+        Reads a graphviz .dot file representing a digraph.
+        Path can be a filesystem path or a file object containing the data.
+        The edges are read straight from the pydot parse tree, without building an intermediate networkx graph.
+        Only edges are read, so stray tokens that pydot loads as nodes, like newlines, are never included.
         """
-        logging.info("Loading graph from dot file")
-        G = nx.DiGraph(nx.nx_pydot.read_dot(path))
-        
-        # Cleanup newlines in the .dot file that get loaded as nodes
-        if G.has_node("\\n"):
-            G.remove_node("\\n")
-    
-        logging.debug(
-            f"\tGraph loaded from dot file: {G}"
-            f"\tNodes: {G.nodes}"
-            f"\tEdges: {G.edges}"
-            )
-        return list(G.edges)
+        log.info("Loading graph from dot file")
+        if hasattr(path, "read"):
+            data = path.read()
+        else:
+            with open(path, 'r') as read_obj:
+                data = read_obj.read()
+        # Only needed when reading .dot files, so importing it is deferred until then
+        import pydot  # type: ignore
+        dot_graph = pydot.graph_from_dot_data(data)[0]
+
+        def node_names(endpoint) -> typing.List[str]:
+            # An edge endpoint is a node name, or a subgraph like `{b c}` that expands to each of its nodes
+            if isinstance(endpoint, str):
+                return [endpoint.strip('"')]
+            return [node.strip('"') for node in endpoint["nodes"]]
+
+        # Like networkx's dot reader, nodes declared on their own are added before the nodes from the edges.
+        # Default attribute statements and stray newlines that pydot loads as nodes are skipped.
+        nodes = (node.get_name().strip('"') for node in dot_graph.get_node_list())
+        nodes = [node for node in nodes if node not in ("node", "edge", "graph", "\\n")]
+        edges = (
+            (u, v)
+            for edge in dot_graph.get_edge_list()
+            for u in node_names(edge.get_source())
+            for v in node_names(edge.get_destination())
+        )
+        # Group the edges by predecessor node, in the same order as `nx.DiGraph.edges`
+        adjacency = CriticalPath._get_adjacency_from_tuples(edges, nodes=nodes)
+        result = [(u, v) for u, successors in adjacency.items() for v in successors]
+
+        log.debug("\tEdges loaded from dot file: %s", result)
+        return result
 
     def load_graph_from_dot_file(self, path: str) -> None:
         """
         Reads a graphviz .dot file representing a digraph.
         """
-        logging.info("Loading graph from dot file")
+        log.info("Loading graph from dot file")
         graph_edges = self._get_edge_tuples_from_dotviz(path=path)
         G = self._get_digraph_from_tuples(graph_edges)
     
-        logging.debug(
-            f"\tGraph loaded: {G}"
-            f"\tNodes: {G.nodes}"
-            f"\tEdges: {G.edges}"
-            )
+        log.debug("\tGraph loaded: %s\tNodes: %s\tEdges: %s", G, G.nodes, G.edges)
         self.graph = G
         return G
 
@@ -273,7 +715,14 @@ if __name__ == "__main__":
         Calculate the critical path and save an image of the graph.
         Requires the graph and weights to be stored as a file before running.
         """
-        logging.info("*** Calculating the critical path ***")
+        logging.basicConfig(
+            encoding='utf-8',
+            format='%(asctime)s.%(msecs)03d %(levelname)s:\t%(message)s',
+            datefmt='%Y-%m-%d %H:%M:%S'
+        )
+        # Debug output from this module only; dependencies like numba are very chatty at DEBUG
+        log.setLevel(logging.DEBUG)
+        log.info("*** Calculating the critical path ***")
         cp = CriticalPath()
         cp.load_graph_from_dot_file(path=graph)
         cp.load_weights(path=weights)
@@ -281,9 +730,14 @@ if __name__ == "__main__":
         if image_target:
             cp.save_image(fname=image_target)
         else:
-            logging.debug("Skipping image creation.  To save an image, run with the -i flag set to the image target directory.")
+            log.debug("Skipping image creation.  To save an image, run with the -i flag set to the image target directory.")
         import sys
-        sys.stdout.write(str(critical_path))
+        # Stream one `u,v,weight` csv row per edge, so downstream pipes can consume the path as it is written.
+        # The csv writer quotes node names that contain commas or quotes.
+        csv_writer = writer(sys.stdout, lineterminator="\n")
+        for (u, v), weight in critical_path.items():
+            csv_writer.writerow((u, v, weight))
+        sys.stdout.flush()
         sys.exit(0)
 
     main()
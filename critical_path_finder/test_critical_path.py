@@ -1,37 +1,41 @@
 #!/usr/bin/env python
 
 import sys
+import copy
+import pickle
 from io import BytesIO
 import pytest
-from .critical_path_finder import CriticalPath, RunBeforeSaveException, MissingInputsException, NodeWeightsDuplicateValues, MustBeDirectedAcyclicGraph
-from networkx.exception import NetworkXUnfeasible
+import numpy as np
+from .critical_path_finder import CriticalPath, RunBeforeSaveException, MissingInputsException, NodeWeightsDuplicateValues, MustBeDirectedAcyclicGraph, NodeWeightsMustBeIntegers, NUMBA_AVAILABLE, JIT_MIN_EDGES, LAYERED_MIN_EDGES_PER_LAYER, _get_topological_order_kernel, _get_longest_path_kernel, _get_jit_kernels, _longest_path_csr_loop, _longest_path_csr_python, _longest_path_csr_numpy, _topological_order_csr_loop, _topological_order_csr_python
+from networkx.exception import NetworkXUnfeasible, NetworkXError
 from networkx import DiGraph
 
 
 def test__get_digraph_from_tuples():
     assert type(CriticalPath._get_digraph_from_tuples([(1,2), (2,3)])) == DiGraph
+    assert list(CriticalPath._get_digraph_from_tuples(edge for edge in [(1,2), (2,3)]).edges) == [(1,2), (2,3)]
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def node_weights_map():
     return {1:1, 2:2, 3:3}
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def graph():
     return CriticalPath._get_digraph_from_tuples([(1,2), (2,3)])
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def graph_cycle():
     return [(1,2), (2,3), (3,1)]
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def node_weights_map_complex():
     return {1:1, 2:2, 3:3, 4:4, 5:5}
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def graph_complex():
     return CriticalPath._get_digraph_from_tuples([(1,2), (2,3), (3,4), (4,5), (1,5)])
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def dot_digraph():
     graph = """
 digraph G { 
@@ -65,10 +69,42 @@ def test_get_edge_tuples_from_dotviz(dot_digraph):
         result = CriticalPath._get_edge_tuples_from_dotviz(g)
     assert result == expected
 
+    # Edges are grouped by predecessor node like `DiGraph.edges`, with nodes declared on their own line first
+    with StringIO("digraph G { x; b -> c; a -> b; b -> x; a -> c; x -> c }") as g:
+        result = CriticalPath._get_edge_tuples_from_dotviz(g)
+    assert result == [('x', 'c'), ('b', 'c'), ('b', 'x'), ('a', 'b'), ('a', 'c')]
+
 def test_critical_path(node_weights_map, graph, node_weights_map_complex, graph_complex):
     cp_simple = CriticalPath(node_weights_map=node_weights_map, graph=graph)
     assert cp_simple.find() == {(1,2): 1, (2,3): 2}
     assert cp_simple.validate() == None
+
+    # The result is cached until an input is replaced
+    assert cp_simple.find() == {(1,2): 1, (2,3): 2}
+    cp_simple.node_weights_map = {1:5, 2:2, 3:3}
+    assert cp_simple.find() == {(1,2): 5, (2,3): 2}
+    assert cp_simple.critical_path_length == 7
+
+    # Inputs are copied when assigned, so changing the originals in place can't make the cached result stale
+    weights, G = {1:1, 2:2, 3:3}, DiGraph([(1,2), (2,3)])
+    cp_copied = CriticalPath(node_weights_map=weights, graph=G)
+    assert cp_copied.find() == {(1,2): 1, (2,3): 2}
+    weights[2] = -5
+    G.add_edge(3, 1)
+    assert cp_copied.find() == {(1,2): 1, (2,3): 2}
+    with pytest.raises(TypeError):
+        cp_copied.node_weights_map[2] = -5
+    # The graph reads back as a frozen snapshot, so it can't be changed in place either
+    assert list(cp_copied.graph.edges) == [(1,2), (2,3)]
+    with pytest.raises(NetworkXError):
+        cp_copied.graph.add_edge(3, 4)
+    # The instance can still be copied and pickled, for example to send it to another process
+    assert pickle.loads(pickle.dumps(cp_copied)).find() == {(1,2): 1, (2,3): 2}
+    assert copy.deepcopy(cp_copied).node_weights_map == {1:1, 2:2, 3:3}
+    # Assigning the changed inputs again picks up the changes
+    cp_copied.graph = G
+    with pytest.raises(MustBeDirectedAcyclicGraph):
+        cp_copied.find()
     
     cp_complex = CriticalPath(node_weights_map=node_weights_map_complex, graph=graph_complex)
     assert cp_complex.validate() == None
@@ -80,9 +116,19 @@ def test_critical_path(node_weights_map, graph, node_weights_map_complex, graph_
     with pytest.raises(MissingInputsException):
         CriticalPath().find()
 
+    # Fractional weights are rejected instead of being truncated
+    with pytest.raises(NodeWeightsMustBeIntegers):
+        CriticalPath(node_weights_map={1:1.5, 2:2.5, 3:3}, graph=graph).find()
+    assert CriticalPath(node_weights_map={1:1.0, 2:2, 3:3}, graph=graph).find() == {(1,2): 1, (2,3): 2}
+
 def test_edge_weights(node_weights_map, graph):
     cp_complex = CriticalPath(node_weights_map=node_weights_map, graph=graph)
     assert cp_complex.edge_weights == {(1, 2): 1, (2, 3): 2}
+    assert cp_complex.edge_weights is cp_complex.edge_weights
+
+    # Replacing an input invalidates the cached value
+    cp_complex.node_weights_map = {1: 4, 2: 5, 3: 6}
+    assert cp_complex.edge_weights == {(1, 2): 4, (2, 3): 5}
 
 def test_get_edges_from_ordered_list_of_nodes():
     nodes = [1, 2, 3]
@@ -90,17 +136,25 @@ def test_get_edges_from_ordered_list_of_nodes():
     result = CriticalPath._get_edges_from_ordered_list_of_nodes(nodes=nodes)
     assert expected == result
 
-@pytest.mark.skip(reason="Needs handling to read from filesystem")
-def test_load_weights():
-    # TODO: Positive test
+def test_load_weights(tmp_path):
+    path = tmp_path / "weights.csv"
+    path.write_text("task,duration\nt1,0\nt2,2\n")
+    cp = CriticalPath()
+    cp.load_weights(path=path)
+    assert cp.node_weights_map == {"t1": 0, "t2": 2}
 
-    # TODO: Negative test
+    path.write_text("task,duration\nt1,1\nt2,2\nt1,3\n")
     with pytest.raises(NodeWeightsDuplicateValues):
-        pass
-    pass
+        cp.load_weights(path=path)
+
+    # A node with weight 0 is still detected as a duplicate
+    path.write_text("task,duration\nt1,0\nt1,3\n")
+    with pytest.raises(NodeWeightsDuplicateValues):
+        cp.load_weights(path=path)
 
 def test_save_image(node_weights_map, graph):
-    
+    matplotlib = pytest.importorskip("matplotlib")
+
     with BytesIO() as path:
 
         with pytest.raises(MissingInputsException):
@@ -111,9 +165,112 @@ def test_save_image(node_weights_map, graph):
 
         cp = CriticalPath(node_weights_map=node_weights_map, graph=graph)
         cp.find()
+        backend = matplotlib.get_backend()
         fileobj = cp.save_image(fname=path)
         assert type(fileobj) == BytesIO
+        # Saving an image leaves the caller's matplotlib backend alone
+        assert matplotlib.get_backend() == backend
         # To identify if file generation logic changed, resulting in different file size. 
         # If image file still looks okay update the `expected_size` value to the new value
-        expected_size = 11376
-        assert sys.getsizeof(fileobj) == expected_size
+        expected_size = 10055
+        assert len(fileobj.getbuffer()) == expected_size
+
+def test_save_image_without_matplotlib(node_weights_map, graph, monkeypatch):
+    # A None entry in sys.modules makes importing that module fail
+    monkeypatch.setitem(sys.modules, "matplotlib.figure", None)
+    cp = CriticalPath(node_weights_map=node_weights_map, graph=graph)
+    cp.find()
+    with pytest.raises(ImportError, match=r"critical-path-finder\[plot\]"):
+        cp.save_image(fname=BytesIO())
+
+def test_get_csr_from_digraph(graph_complex):
+    nodes, indptr, indices = CriticalPath._get_csr_from_digraph(graph_complex)
+    assert nodes == [1, 2, 3, 4, 5]
+    assert indptr.tolist() == [0, 2, 3, 4, 5, 5]
+    assert indices.tolist() == [1, 4, 2, 3, 4]
+
+    # Nodes labelled by position take the same shape as relabelled ones
+    nodes, indptr, indices = CriticalPath._get_csr_from_digraph(DiGraph([(0,1), (1,2), (2,3), (3,4), (0,4)]))
+    assert nodes == [0, 1, 2, 3, 4]
+    assert indptr.tolist() == [0, 2, 3, 4, 5, 5]
+    assert indices.tolist() == [1, 4, 2, 3, 4]
+
+def test_get_topological_order_from_csr(graph_complex, graph_cycle):
+    _, indptr, indices = CriticalPath._get_csr_from_digraph(graph_complex)
+    topo, depth = CriticalPath._get_topological_order_from_csr(indptr, indices)
+    assert topo.tolist() == [0, 1, 2, 3, 4]
+    assert depth == 5
+
+    with pytest.raises(MustBeDirectedAcyclicGraph):
+        _, indptr, indices = CriticalPath._get_csr_from_digraph(DiGraph(graph_cycle))
+        CriticalPath._get_topological_order_from_csr(indptr, indices)
+
+requires_numba = pytest.mark.skipif(not NUMBA_AVAILABLE, reason="numba is not installed")
+
+def test_get_kernels():
+    assert _get_topological_order_kernel(0) == _topological_order_csr_python
+    # Deep graphs use the list-based loop, and only wide, shallow graphs use the layered NumPy version
+    assert _get_longest_path_kernel(100_000, 100_000) == _longest_path_csr_python
+    assert _get_longest_path_kernel(LAYERED_MIN_EDGES_PER_LAYER * 10, 10) == _longest_path_csr_numpy
+    # The tests import the module from the package, so the compiled kernels can be used
+    if NUMBA_AVAILABLE:
+        assert _get_topological_order_kernel(JIT_MIN_EDGES) == _get_jit_kernels()[1]
+        assert _get_longest_path_kernel(JIT_MIN_EDGES, JIT_MIN_EDGES) == _get_jit_kernels()[0]
+
+@pytest.mark.parametrize("topological_order_csr", [
+    _topological_order_csr_loop,
+    _topological_order_csr_python,
+    pytest.param(lambda *args: _get_jit_kernels()[1](*args), marks=requires_numba, id="jit"),
+])
+def test_topological_order_csr(topological_order_csr, graph_cycle):
+    _, indptr, indices = CriticalPath._get_csr_from_digraph(DiGraph([(1,2), (1,3), (2,4), (3,4), (5,4)]))
+    topo, depth = topological_order_csr(indptr, indices)
+    assert topo.tolist() == [0, 4, 1, 2, 3]
+    assert depth == 3
+
+    # Nodes on the cycle are never released
+    _, indptr, indices = CriticalPath._get_csr_from_digraph(DiGraph(graph_cycle))
+    topo, _ = topological_order_csr(indptr, indices)
+    assert len(topo) < len(indptr) - 1
+
+@pytest.mark.parametrize("longest_path_csr", [
+    _longest_path_csr_loop,
+    _longest_path_csr_python,
+    _longest_path_csr_numpy,
+    pytest.param(lambda *args: _get_jit_kernels()[0](*args), marks=requires_numba, id="jit"),
+])
+def test_longest_path_csr(longest_path_csr, graph_complex, node_weights_map_complex):
+    nodes, indptr, indices = CriticalPath._get_csr_from_digraph(graph_complex)
+    weights = np.array([node_weights_map_complex[node] for node in nodes], dtype=np.int64)
+    topo, _ = CriticalPath._get_topological_order_from_csr(indptr, indices)
+    dist, pred = longest_path_csr(indptr, indices, weights, topo)
+    assert dist.tolist() == [0, 1, 3, 6, 10]
+    assert pred.tolist() == [-1, 0, 1, 2, 3]
+
+    # On a tie, the first predecessor in topological order is kept
+    nodes, indptr, indices = CriticalPath._get_csr_from_digraph(DiGraph([(1,2), (1,3), (2,4), (3,4)]))
+    weights = np.ones(len(nodes), dtype=np.int64)
+    topo, _ = CriticalPath._get_topological_order_from_csr(indptr, indices)
+    dist, pred = longest_path_csr(indptr, indices, weights, topo)
+    assert dist.tolist() == [0, 1, 1, 2]
+    assert pred.tolist() == [-1, 0, 0, 1]
+
+def test_get_edges_from_predecessors():
+    nodes = ["a", "b", "c", "d"]
+    pred = np.array([-1, 0, 1, -1])
+    assert CriticalPath._get_edges_from_predecessors(nodes=nodes, pred=pred, v=2) == [("a", "b"), ("b", "c")]
+    assert CriticalPath._get_edges_from_predecessors(nodes=nodes, pred=pred, v=3) == []
+
+def test_from_edges(node_weights_map, graph_cycle):
+    cp = CriticalPath.from_edges([(1,2), (2,3)], node_weights_map=node_weights_map)
+    assert cp.find() == {(1,2): 1, (2,3): 2}
+    assert cp.edge_weights == {(1, 2): 1, (2, 3): 2}
+    # The networkx graph is only built on first access
+    assert cp._graph is None
+    assert type(cp.graph) == DiGraph
+
+    with pytest.raises(MustBeDirectedAcyclicGraph):
+        CriticalPath.from_edges(graph_cycle, node_weights_map=node_weights_map).find()
+
+    with pytest.raises(MissingInputsException):
+        CriticalPath.from_edges([], node_weights_map=node_weights_map).find()
@@ -16,14 +16,17 @@ DESCRIPTION = 'Calculate the critical (longest) path within a network of task de
 URL = 'https://github.com/jayljohnson/critical-path-finder'
 EMAIL = 'jljohn00+github@gmail.com'
 AUTHOR = 'Jay L. Johnson'
-REQUIRES_PYTHON = '>=3.6.0'
+REQUIRES_PYTHON = '>=3.9.0'
 VERSION = '0.1.0'
 
 REQUIRED = [
-    'networkx>=2.8.3', 'pydot>=1.4.2', 'matplotlib>=3.5.2', 'pytest>=7.1.2', 'click>=8.1.3'
+    'networkx>=2.8.3', 'pydot>=1.4.2', 'pytest>=7.1.2', 'click>=8.1.3', 'numpy>=1.22.4'
     ]
 
-EXTRAS = None
+EXTRAS = {
+    'jit': ['numba>=0.56.0'],
+    'plot': ['matplotlib>=3.5.2'],
+}
 
 here = os.path.abspath(os.path.dirname(__file__))
 
@@ -97,6 +100,7 @@ setup(
         'License :: OSI Approved :: Apache Software License',
         'Programming Language :: Python',
         'Programming Language :: Python :: 3',
+        'Programming Language :: Python :: 3.9',
         'Programming Language :: Python :: 3.10',
     ],
     # $ setup.py publish support.